@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class ContextCache(ABC):
+    """
+    Keeps one cached prompt prefix (system instruction plus static contents)
+    per slot and hands out a handle to it.
+
+    The prefix is recreated whenever its content hash changes (new CSV, edited
+    instructions) or the cache is about to expire. Subclasses decide where the
+    prefix lives and how a request references it.
+    """
+
+    # Recreate this many seconds before the TTL runs out
+    EXPIRY_MARGIN_SECONDS = 60
+
+    def __init__(self, ttl_seconds=3600):
+        self.ttl_seconds = ttl_seconds
+        self.creations = 0
+        self._entries = {}  # slot -> (content key, handle or None, expires_at)
+        self._slot_locks = {}
+        # Guards the dicts above only; cache creation runs under the slot's own lock
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_key(model, system_instruction, prefix_text):
+        digest = hashlib.sha256()
+        for part in (model, system_instruction, prefix_text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def handle_for(self, slot, model, system_instruction, prefix_text):
+        """
+        Return the handle for this prefix, creating or replacing the cache if needed.
+
+        Returns:
+            Cache handle, or None if the prefix could not be cached and must be sent inline
+        """
+        key = self.content_key(model, system_instruction, prefix_text)
+        with self._lock:
+            slot_lock = self._slot_locks.setdefault(slot, threading.Lock())
+
+        # Requests for the same slot wait for one creation; other slots are not blocked
+        with slot_lock:
+            with self._lock:
+                entry = self._entries.get(slot)
+            if entry and entry[0] == key and time.time() < entry[2]:
+                return entry[1]
+
+            if entry and entry[1] is not None:
+                self._delete(entry[1])
+
+            try:
+                handle = self._create(slot, model, system_instruction, prefix_text)
+                created = True
+            except Exception as e:
+                # Remember the failure for this prefix so we don't retry on every request
+                print(f"Error creating context cache for {slot}, sending prefix inline: {e}")
+                handle = None
+                created = False
+
+            expires_at = time.time() + self.ttl_seconds - self.EXPIRY_MARGIN_SECONDS
+            with self._lock:
+                if created:
+                    self.creations += 1
+                self._entries[slot] = (key, handle, expires_at)
+            return handle
+
+    def request(self, slot, model, system_instruction, prefix_text, user_query, config):
+        """
+        Build generate_content arguments that reuse the cached prefix.
+
+        Args:
+            slot: Name of the prompt prefix (one cache per slot)
+            model: Model the cache is created for
+            system_instruction: Invariant system instruction
+            prefix_text: Invariant leading contents (e.g. the county table)
+            user_query: Per-request contents
+            config: Per-request generation config dict
+
+        Returns:
+            Tuple of (contents, config) for client.models.generate_content
+        """
+        handle = self.handle_for(slot, model, system_instruction, prefix_text)
+        if handle is None:
+            return [prefix_text, user_query], {**config, "system_instruction": system_instruction}
+        return self._request_with(handle, user_query, config)
+
+    @abstractmethod
+    def _create(self, slot, model, system_instruction, prefix_text):
+        """Store the prefix and return its handle."""
+
+    def _delete(self, handle):
+        pass
+
+    @abstractmethod
+    def _request_with(self, handle, user_query, config):
+        """Return (contents, config) that reference the prefix behind ``handle``."""
+
+
+class GeminiContextCache(ContextCache):
+    """Stores the prefix server-side with Gemini explicit context caching."""
+
+    def __init__(self, client, ttl_seconds=3600):
+        super().__init__(ttl_seconds)
+        self.client = client
+
+    def _create(self, slot, model, system_instruction, prefix_text):
+        cached_content = self.client.caches.create(
+            model=model,
+            config={
+                "display_name": slot,
+                "system_instruction": system_instruction,
+                "contents": [prefix_text],
+                "ttl": f"{self.ttl_seconds}s"
+            }
+        )
+        return cached_content.name
+
+    def _delete(self, handle):
+        try:
+            self.client.caches.delete(name=handle)
+        except Exception as e:
+            print(f"Error deleting context cache {handle}: {e}")
+
+    def _request_with(self, handle, user_query, config):
+        return user_query, {**config, "cached_content": handle}
+
+
+class LocalContextCache(ContextCache):
+    """
+    In-process stand-in for GeminiContextCache.
+
+    Prefixes are kept in memory under local handles and sent inline, so the
+    engineer can be exercised with any client passed to it (including fakes)
+    while the handle and recreation logic stays the same.
+    """
+
+    def __init__(self, ttl_seconds=3600):
+        super().__init__(ttl_seconds)
+        self.prefixes = {}
+
+    def _create(self, slot, model, system_instruction, prefix_text):
+        handle = f"local/{slot}/{self.creations + 1}"
+        self.prefixes[handle] = (system_instruction, prefix_text)
+        return handle
+
+    def _delete(self, handle):
+        self.prefixes.pop(handle, None)
+
+    def _request_with(self, handle, user_query, config):
+        system_instruction, prefix_text = self.prefixes[handle]
+        return [prefix_text, user_query], {**config, "system_instruction": system_instruction}
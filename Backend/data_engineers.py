@@ -5,6 +5,10 @@ import json
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field, field_validator
 from typing import List, Literal, Dict
+from context_cache import GeminiContextCache
+from ensemble import monte_carlo_ensemble
+from relevance_classifier import append_log
+from structured_output import STAGE_STATS, CountySchema, gemini_schema, parse_structured
 
 # Ensure environment variables are loaded for the client initialization
 load_dotenv()
@@ -25,6 +29,52 @@ METRIC_TO_CSV_COLUMN: Dict[str, str] = {
     "AQI": "Annual Avg. AQI (0-500)"
 }
 
+# Thresholds for ensemble exceedance probabilities (AQI "unhealthy for sensitive
+# groups", annual NO2 and PM2.5 NAAQS); GWP has no regulatory threshold
+EXCEEDANCE_THRESHOLDS: Dict[str, float] = {
+    "AQI": 100,
+    "NO2": 53,
+    "PM2.5": 9.0
+}
+
+# Invariant instructions for the county stages. These are cached together with
+# the county table, so anything request-specific belongs in the user query.
+COUNTY_PREDICTION_INSTRUCTION = (
+    "You are an environmental data expert analyzing how a scenario affects different counties. "
+    "The county table lists every Washington county with its current baseline values. "
+    "Each request gives a SCENARIO and a METRIC.\n\n"
+    
+    "Your task is to predict the new value of the requested metric for each county under the scenario. "
+    "Consider:"
+    "\n- Local characteristics (urban/rural, industry, geography)"
+    "\n- Current pollution levels"
+    "\n- How the scenario would specifically affect that county"
+    "\n- Population density and local economy"
+    "\n- Realistic environmental science principles"
+    "\n\n"
+    "IMPORTANT: Your predicted values should be scientifically realistic and logically consistent:"
+    "\n- If scenario reduces pollution sources, values should be LOWER than current"
+    "\n- If scenario increases pollution sources, values should be HIGHER than current"
+    "\n- Consider the magnitude of change based on local impact"
+    "\n\n"
+    "Return a JSON object with every county name as a key and its predicted value as the value."
+)
+
+COUNTY_INSIGHT_INSTRUCTION = (
+    "**Persona:** You are a Senior Climate Data Scientist and GIS Analyst specializing in the localized impact of environmental scenarios. "
+    "Your analysis must be technically rigorous and grounded entirely in the numerical data provided. "
+    "The county table lists every Washington county's seat, population density, location and current baselines; "
+    "each request gives the SCENARIO, METRIC, BASELINE CONTEXT and per-county scenario results.\n"
+    
+    "Your task is to generate a concise, impressive, and technical 2-3 sentence insight for each county. "
+    "The insight must explicitly address the following criteria in a fluid, non-bulleted paragraph:"
+    "\n1. **Causal Mechanism:** Explain the predicted change by referencing the **Scenario Factor** (e.g., 'a 0.9375x factor') and calculating the precise percentage change (e.g., 'a 6.25% reduction')."
+    "\n2. **Explanatory Variables:** Correlate the **Population Density** or geographic location (e.g., near coast/major cities) with the Scenario Factor to hypothesize a technical reason for the specific impact (e.g., proximity to air freight hubs, or low population/rural area immunity)."
+    "\n3. **Implication:** Discuss a real-world, data-driven implication of this change on the county's infrastructure, logistics, or regional economy."
+    
+    "\n\n**Output Requirement:** Return a JSON object with every county name as a key and the technical insight string as the value. Do NOT use markdown in the JSON values."
+)
+
 class CountyDataPoint(BaseModel):
     """Schema for individual county data point output."""
     name: str = Field(description="County name")
@@ -67,6 +117,12 @@ class ScenarioSpecification(BaseModel):
         description="A brief description of the scenario being simulated"
     )
     
+class PromptClassification(BaseModel):
+    """Pydantic model for the relevance classifier's structured output."""
+    relevant: bool = Field(description="Whether the prompt is about environmental data simulation")
+    makes_sense_to_model: bool = Field(description="Whether the scenario has a plausible, measurable environmental impact")
+    reason: str = Field(description="Short justification for the verdict")
+    suggestions: List[str] = Field(description="Alternative prompts the user could try")
 
 
 class DirectorofDataEngineering:
@@ -75,12 +131,43 @@ class DirectorofDataEngineering:
     specification for the data generation engineer.
     """
     
-    def __init__(self, unique_latitude_longitude_file):
+    def __init__(self, unique_latitude_longitude_file, relevance_classifier=None, relevance_log_file=None,
+                 client=None):
         self.latitude_longitude_file = unique_latitude_longitude_file
-        self.client = genai.Client()
+        self.client = client or genai.Client()
+        # Optional local fast path; uncertain prompts still go to the LLM
+        self.relevance_classifier = relevance_classifier
+        # LLM verdicts are appended here to train the local classifier
+        self.relevance_log_file = relevance_log_file
 
     def classify_prompt_relevance(self, user_prompt):
         """Classify the user prompt to ensure it is a valid prompt."""
+        if self.relevance_classifier is not None:
+            local_verdict = self.relevance_classifier.classify(user_prompt)
+            if local_verdict is not None:
+                STAGE_STATS.record("classify_local", "ok")
+                return local_verdict
+
+        verdict = self._classify_with_llm(user_prompt)
+        if verdict is None:
+            return False  # Default to safe side
+
+        if self.relevance_classifier is not None:
+            self.relevance_classifier.update(user_prompt, verdict)
+        if self.relevance_log_file:
+            try:
+                append_log(self.relevance_log_file, user_prompt, verdict)
+            except OSError as e:
+                print(f"Error logging relevance verdict: {e}")
+        return verdict
+
+    def _classify_with_llm(self, user_prompt):
+        """
+        Ask the LLM whether the prompt is relevant and makes sense to model.
+        
+        Returns:
+            True/False verdict, or None if the call or its response failed
+        """
         classification_prompt = f"""
         Determine if the user prompt is relevant to environmental data simulation, and if it makes sense to model.
         
@@ -104,12 +191,6 @@ class DirectorofDataEngineering:
         - "Impact of eating ice cream on air quality" (no scientific basis)
         
         User Prompt: "{user_prompt}"
-        
-        Return ONLY a valid JSON object with these exact fields:
-        - relevant: boolean
-        - makes_sense_to_model: boolean  
-        - reason: string
-        - suggestions: list of strings
         """
 
         try:
@@ -117,25 +198,23 @@ class DirectorofDataEngineering:
                 model="gemini-2.5-flash-lite",
                 contents=classification_prompt,
                 config={
-                    "response_mime_type": "application/json"
+                    "response_mime_type": "application/json",
+                    "response_schema": gemini_schema(PromptClassification)
                 }
             )
-            classification = json.loads(response.text)
-            
-            # Validate the response structure
-            if not isinstance(classification, dict):
-                return False
-                
-            # Check both conditions
-            is_relevant = classification.get('relevant', False)
-            makes_sense = classification.get('makes_sense_to_model', False)
-            
-            # Both must be true to proceed
-            return is_relevant and makes_sense
-            
         except Exception as e:
             print(f"Error classifying prompt relevance: {e}")
-            return False  # Default to safe side
+            STAGE_STATS.record("classify", "error")
+            STAGE_STATS.record_fallback("classify")
+            return None
+
+        classification = parse_structured("classify", response.text, PromptClassification)
+        if classification is None:
+            STAGE_STATS.record_fallback("classify")
+            return None
+
+        # Both must be true to proceed
+        return classification.relevant and classification.makes_sense_to_model
 
         
     def directions(self, user_prompt):
@@ -169,37 +248,36 @@ class DirectorofDataEngineering:
             "\n3. Timeframe: Target year (assume next year if not specified)"
             "\n4. Standard Deviation: Variation amount for randomness (typically 1-5)"
             "\n5. Description: Brief summary of the scenario (10-500 characters)"
-            
-            "Return ONLY a valid JSON object with these exact fields:"
-            "\n- target_metric: string (from the list above)"
-            "\n- unit: string (compatible with the metric)"
-            "\n- target_timeframe: string"
-            "\n- standard_deviation: number (≥ 0)"
-            "\n- scenario_description: string (10-500 characters)"
         )
         
-        # Create JSON schema from Pydantic model
-        json_schema = ScenarioSpecification.model_json_schema()
-        
+        # Constrain decoding to the Pydantic model's JSON schema
         config = types.GenerateContentConfig(
             system_instruction=system_instruction_text,
-            response_mime_type="application/json"
-        )
-        
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=[user_prompt],
-            config=config
+            response_mime_type="application/json",
+            response_schema=gemini_schema(ScenarioSpecification)
         )
         
-        # Parse and validate the response using Pydantic
         try:
-            specification_data = json.loads(response.text)
-            validated_spec = ScenarioSpecification(**specification_data)
-            return validated_spec.model_dump_json(indent=2)
-        except (json.JSONDecodeError, ValueError) as e:
-            # Fallback to raw text if parsing fails
-            return response.text
+            response = self.client.models.generate_content(
+                model="gemini-2.5-flash-lite",
+                contents=[user_prompt],
+                config=config
+            )
+        except Exception as e:
+            print(f"Error generating scenario specification: {e}")
+            STAGE_STATS.record("directions", "error")
+            validated_spec = None
+        else:
+            # Parse and validate the response using Pydantic
+            validated_spec = parse_structured("directions", response.text, ScenarioSpecification)
+        
+        if validated_spec is None:
+            return json.dumps({
+                "error": "INVALID_SPECIFICATION",
+                "message": "Director failed to generate a valid specification.",
+                "suggestions": ["Please try rephrasing your prompt."]
+            })
+        return validated_spec.model_dump_json(indent=2)
     
     def pass_dummy_csv(self):
         """Return the path to the latitude/longitude CSV file."""
@@ -210,17 +288,22 @@ class GeminiDataEngineer:
     Generates simulated environmental data based on technical specifications.
     """
     
-    def __init__(self):
-        self.client = genai.Client()
+    def __init__(self, context_cache=None, client=None):
+        self.client = client or genai.Client()
         self.model = "gemini-2.5-flash-lite"
+        # Holds the invariant instructions + county table shared by every request
+        self.context_cache = context_cache or GeminiContextCache(self.client)
         
-    def simulate(self, director_prompt, dummy_file):
+    def simulate(self, director_prompt, dummy_file, ensemble_samples=0, seed=None):
         """
         Generate simulated environmental data based on director specifications.
         
         Args:
             director_prompt: Technical specification from the director
             dummy_file: Path to CSV file with location data
+            ensemble_samples: If > 0, add a Monte Carlo uncertainty ensemble with
+                this many realizations per county (no extra LLM calls)
+            seed: Seed for the ensemble's random generator
             
         Returns:
             Dict containing simulated data with CountyDataPoint objects, or error dict
@@ -258,28 +341,12 @@ class GeminiDataEngineer:
             std_dev = 2.0
             scenario_description = 'Default scenario'
         
-        # Load the CSV data
-        df_input = pd.read_csv(dummy_file)
-        
-        # Get the CSV column for the target metric
-        csv_column = METRIC_TO_CSV_COLUMN.get(target_metric, 'NO2 Avg. (ppb)')
-        
         # Use LLM to generate county-specific scenario factors
         data_points = []
         predicted_values = []
         
         # Prepare county data for LLM
-        county_data = []
-        for _, row in df_input.iterrows():
-            county_info = {
-                "name": row['County Name'],
-                "lat": float(row['Latitude']),
-                "lon": float(row['Longitude']),
-                "seat": row['County Seat'],
-                "density": int(row['Pop. Density']),
-                "ground_truth_value": float(row[csv_column])
-            }
-            county_data.append(county_info)
+        county_data = self._load_county_data(dummy_file, target_metric)
         
         # Generate county-specific predicted values using LLM
         county_predictions = self._generate_county_predictions(
@@ -342,8 +409,74 @@ class GeminiDataEngineer:
             }
         }
         
+        if ensemble_samples > 0 and predicted_values:
+            simulated_data["ensemble"] = self._build_ensemble(
+                data_points, predicted_values, target_metric, std_dev, ensemble_samples, seed
+            )
+        
         return simulated_data
     
+    @staticmethod
+    def _load_county_data(dummy_file, target_metric):
+        """
+        Load the county table from the CSV.
+        
+        Returns:
+            List of county dicts with the target metric's baseline as
+            ground_truth_value and every metric's baseline under 'baselines'
+        """
+        df_input = pd.read_csv(dummy_file)
+        
+        # Get the CSV column for the target metric
+        csv_column = METRIC_TO_CSV_COLUMN.get(target_metric, 'NO2 Avg. (ppb)')
+        
+        county_data = []
+        for _, row in df_input.iterrows():
+            county_info = {
+                "name": row['County Name'],
+                "lat": float(row['Latitude']),
+                "lon": float(row['Longitude']),
+                "seat": row['County Seat'],
+                "density": int(row['Pop. Density']),
+                "ground_truth_value": float(row[csv_column]),
+                "baselines": {metric: float(row[column]) for metric, column in METRIC_TO_CSV_COLUMN.items()}
+            }
+            county_data.append(county_info)
+        
+        return county_data
+    
+    @staticmethod
+    def _build_ensemble(data_points, predicted_values, target_metric, std_dev, n_samples, seed):
+        """
+        Summarize Monte Carlo realizations around the LLM predictions using the
+        director's standard deviation.
+        
+        Returns:
+            Dict with ensemble settings and per-county percentile bands and
+            exceedance probabilities
+        """
+        threshold = EXCEEDANCE_THRESHOLDS.get(target_metric)
+        bands = monte_carlo_ensemble(
+            predicted_values,
+            std_dev,
+            n_samples=n_samples,
+            seed=seed,
+            threshold=threshold,
+            normalization_range=(min(predicted_values), max(predicted_values))
+        )
+        
+        counties = {}
+        for i, data_point in enumerate(data_points):
+            counties[data_point.name] = {key: float(values[i]) for key, values in bands.items()}
+        
+        return {
+            "samples": n_samples,
+            "seed": seed,
+            "standard_deviation": std_dev,
+            "threshold": threshold,
+            "counties": counties
+        }
+    
     def _generate_county_predictions(self, director_spec, county_data, target_metric, scenario_description):
         """
         Use LLM to generate county-specific predicted values based on local characteristics.
@@ -357,190 +490,205 @@ class GeminiDataEngineer:
         Returns:
             Dict mapping county names to predicted values
         """
-        # Prepare county information for LLM
-        county_list = []
-        for county in county_data:
-            county_info = f"""
-            County: {county['name']}
-            Seat: {county['seat']}
-            Population Density: {county['density']} people/sq mi
-            Current {target_metric}: {county['ground_truth_value']} {director_spec.get('unit', 'ppb')}
-            Location: {county['lat']:.4f}, {county['lon']:.4f}
-            """
-            county_list.append(county_info)
-        
-        counties_text = "\n".join(county_list)
-        
-        system_instruction = (
-            f"You are an environmental data expert analyzing how a scenario affects different counties. "
-            f"SCENARIO: {scenario_description}\n"
-            f"METRIC: {target_metric}\n\n"
-            
-            f"Your task is to predict the new {target_metric} value for each county under this scenario. "
-            f"Consider:"
-            f"\n- Local characteristics (urban/rural, industry, geography)"
-            f"\n- Current pollution levels"
-            f"\n- How the scenario would specifically affect that county"
-            f"\n- Population density and local economy"
-            f"\n- Realistic environmental science principles"
-            f"\n\n"
-            f"IMPORTANT: Your predicted values should be scientifically realistic and logically consistent:"
-            f"\n- If scenario reduces pollution sources, values should be LOWER than current"
-            f"\n- If scenario increases pollution sources, values should be HIGHER than current"
-            f"\n- Consider the magnitude of change based on local impact"
-            f"\n\n"
-            f"Return ONLY a JSON object with county names as keys and predicted values as values:"
-            f"\n{{\"King\": 18.5, \"Adams\": 2.2, \"Benton\": 6.3, ...}}"
-        )
-        
+        unit = director_spec.get('unit', 'ppb')
         user_query = f"""
-        Analyze these Washington counties and predict their new {target_metric} values under this scenario:
+        SCENARIO: {scenario_description}
+        METRIC: {target_metric} ({unit})
         
-        {counties_text}
-        
-        Return a JSON object with county names as keys and predicted values as values.
+        Predict the new {target_metric} value for every county in the table under this scenario,
+        starting from its current {target_metric} baseline.
         """
         
+        county_schema = CountySchema(
+            "CountyPredictions",
+            [county['name'] for county in county_data],
+            float,
+            f"Predicted {target_metric} value",
+            ge=0
+        )
+        
         try:
+            contents, config = self.context_cache.request(
+                "county_predictions",
+                self.model,
+                COUNTY_PREDICTION_INSTRUCTION,
+                self._county_table(county_data),
+                user_query,
+                {
+                    "response_mime_type": "application/json",
+                    "response_schema": gemini_schema(county_schema.model)
+                }
+            )
             response = self.client.models.generate_content(
                 model=self.model,
-                contents=user_query,
-                config={
-                    "system_instruction": system_instruction,
-                    "response_mime_type": "application/json"
-                }
+                contents=contents,
+                config=config
             )
-            
-            county_factors = json.loads(response.text)
-            return county_factors
-            
-        except (json.JSONDecodeError, Exception) as e:
+            STAGE_STATS.record_tokens("county_predictions", response.usage_metadata)
+            county_predictions, missing = county_schema.parse("county_predictions", response.text)
+        except Exception as e:
             print(f"Error generating county predictions: {e}")
-            # Fallback to simple percentage reduction based on density
-            fallback_predictions = {}
-            for county in county_data:
-                density = county['density']
-                current_value = county['ground_truth_value']
-                
-                # Apply different reduction percentages based on density
-                if density > 500:
-                    # Urban areas: 40% reduction
-                    fallback_predictions[county['name']] = current_value * 0.6
-                elif density > 100:
-                    # Suburban areas: 20% reduction  
-                    fallback_predictions[county['name']] = current_value * 0.8
-                else:
-                    # Rural areas: 10% reduction
-                    fallback_predictions[county['name']] = current_value * 0.9
-            return fallback_predictions
+            STAGE_STATS.record("county_predictions", "error")
+            county_predictions, missing = {}, county_schema.county_names
+        
+        if missing:
+            # Fill only the counties the model did not return with the heuristic
+            print(f"Using fallback predictions for {len(missing)} counties")
+            STAGE_STATS.record_fallback("county_predictions")
+            counties_by_name = {county['name']: county for county in county_data}
+            for name in missing:
+                county_predictions[name] = self._fallback_prediction(counties_by_name[name])
+        
+        return county_predictions
     
-    def generate_county_insights(self, simulation_data):
+    @staticmethod
+    def _county_table(counties):
+        """
+        Render the scenario-independent county table used as the cached prompt prefix.
+        
+        Includes every metric's baseline when available so the same table serves all metrics.
+        """
+        county_list = []
+        for county in counties:
+            county_info = f"""
+            County: {county['name']}
+            Seat: {county['seat']}
+            Population Density: {county['density']} people/sq mi
+            Location: {county['lat']:.4f}, {county['lon']:.4f}"""
+            for metric, value in county.get('baselines', {}).items():
+                county_info += f"\n            Current {metric}: {value} {METRIC_UNIT_MAPPING[metric]}"
+            county_list.append(county_info)
+        
+        return "Washington counties:\n" + "\n".join(county_list)
+    
+    @staticmethod
+    def _fallback_prediction(county):
+        """Simple percentage reduction based on density, used when the LLM gives no value."""
+        density = county['density']
+        current_value = county['ground_truth_value']
+        
+        # Apply different reduction percentages based on density
+        if density > 500:
+            # Urban areas: 40% reduction
+            return current_value * 0.6
+        elif density > 100:
+            # Suburban areas: 20% reduction
+            return current_value * 0.8
+        else:
+            # Rural areas: 10% reduction
+            return current_value * 0.9
+    
+    def generate_county_insights(self, simulation_data, dummy_file):
         """
         Generate LLM insights for all counties based on simulation data.
         
         Args:
             simulation_data: The full simulation response data
+            dummy_file: Path to CSV file with location data; the cached county
+                table is built from it so client payloads never change the prefix
             
         Returns:
             Dict mapping county names to insight strings
         """
+        # Extract data from simulation response
+        metric = simulation_data.get('metric', 'NO2')
+        unit = simulation_data.get('unit', 'ppb')
+        scenario_description = simulation_data.get('scenario_description', 'Environmental scenario')
+        data_points = simulation_data.get('dataPoints', [])
+        baseline = simulation_data.get('baseline', {})
+        
+        insight_schema = CountySchema(
+            "CountyInsights",
+            [point['name'] for point in data_points],
+            str,
+            "Technical 2-3 sentence insight",
+            min_length=1
+        )
+        
         try:
-            # Extract data from simulation response
-            metric = simulation_data.get('metric', 'NO2')
-            unit = simulation_data.get('unit', 'ppb')
-            scenario_description = simulation_data.get('scenario_description', 'Environmental scenario')
-            data_points = simulation_data.get('dataPoints', [])
-            baseline = simulation_data.get('baseline', {})
-            
-            # Prepare county data for LLM
-            county_analysis = []
+            # Only the scenario results change between requests; the county
+            # profiles come from the cached prefix
+            county_results = []
             for point in data_points:
-                # Ensure all required data points are included for the LLM to reference
-                county_info = f"""
-                County: {point['name']}
-                County Seat: {point['seat']}
-                Population Density: {point['density']} people/sq mi
-                Ground Truth (Baseline) {metric}: {point['ground_truth_value']:.1f} {unit}
-                Predicted {metric}: {point['predicted_value']:.1f} {unit}
-                Scenario Factor (Change Ratio): {point['scenario_factor']:.4f}x (Note: 1.0 = No Change)
-                Normalized Risk Score: {point.get('normalized', 0.0):.4f} (0=Min, 1=Max)
-                Location: {point['lat']:.4f}, {point['lon']:.4f}
-                """
-                county_analysis.append(county_info)
-            
-            counties_text = "\n".join(county_analysis)
+                county_results.append(
+                    f"{point['name']}: baseline {point['ground_truth_value']:.1f} {unit}, "
+                    f"predicted {point['predicted_value']:.1f} {unit}, "
+                    f"scenario factor {point['scenario_factor']:.4f}x, "
+                    f"normalized risk {point.get('normalized', 0.0):.4f}"
+                )
             
-            # --- REVISED SYSTEM INSTRUCTION FOR TECHNICAL INSIGHTS ---
-            system_instruction = (
-                f"**Persona:** You are a Senior Climate Data Scientist and GIS Analyst specializing in the localized impact of environmental scenarios. "
-                f"Your analysis must be technically rigorous and grounded entirely in the numerical data provided. "
-                
-                f"**SCENARIO:** {scenario_description}\n"
-                f"**METRIC:** {metric} ({unit})\n"
-                f"**BASELINE CONTEXT:** State average {metric}={baseline.get('average', 0):.1f} {unit}. "
-                
-                f"Your task is to generate a concise, impressive, and technical 2-3 sentence insight for each county. "
-                f"The insight must explicitly address the following criteria in a fluid, non-bulleted paragraph:"
-                f"\n1. **Causal Mechanism:** Explain the predicted change by referencing the **Scenario Factor** (e.g., 'a 0.9375x factor') and calculating the precise percentage change (e.g., 'a 6.25% reduction')."
-                f"\n2. **Explanatory Variables:** Correlate the **Population Density** or geographic location (e.g., near coast/major cities) with the Scenario Factor to hypothesize a technical reason for the specific impact (e.g., proximity to air freight hubs, or low population/rural area immunity)."
-                f"\n3. **Implication:** Discuss a real-world, data-driven implication of this change on the county's infrastructure, logistics, or regional economy."
-                
-                f"\n\n**Output Requirement:** Return ONLY a JSON object with county names as keys and the technical insight string as the value. Do NOT use markdown in the JSON values."
-                f"\n{{\"King\": \"Analysis indicates a 9.5% GWP reduction (Factor 0.905x) which is amplified by high density and major airport infrastructure...\", ...}}"
-            )
-            # --------------------------------------------------------
+            results_text = "\n".join(county_results)
             
             user_query = f"""
-            Analyze these Washington counties and provide the required technical insights for each:
+            **SCENARIO:** {scenario_description}
+            **METRIC:** {metric} ({unit})
+            **BASELINE CONTEXT:** State average {metric}={baseline.get('average', 0):.1f} {unit}.
             
-            {counties_text}
+            Scenario results per county (scenario factor 1.0 = no change; normalized risk 0=Min, 1=Max):
+            {results_text}
             
-            Return a JSON object with county names as keys and the technical insight strings as values.
+            Provide the required technical insight for every county in the table.
             """
             
-            # Assuming self.client and self.model are configured for the LLM API call
+            contents, config = self.context_cache.request(
+                "county_insights",
+                self.model,
+                COUNTY_INSIGHT_INSTRUCTION,
+                self._county_table(self._load_county_data(dummy_file, metric)),
+                user_query,
+                {
+                    "response_mime_type": "application/json",
+                    "response_schema": gemini_schema(insight_schema.model)
+                }
+            )
             response = self.client.models.generate_content(
                 model=self.model,
-                contents=user_query,
-                config={
-                    "system_instruction": system_instruction,
-                    "response_mime_type": "application/json"
-                }
+                contents=contents,
+                config=config
             )
+            STAGE_STATS.record_tokens("county_insights", response.usage_metadata)
+            insights, missing = insight_schema.parse("county_insights", response.text)
             
-            insights = json.loads(response.text)
-            return insights
-            
-        except (json.JSONDecodeError, Exception) as e:
+        except Exception as e:
             print(f"Error generating county insights: {e}")
-            # Fallback logic remains the same
-            fallback_insights = {}
-            for point in data_points:
-                county_name = point['name']
-                density = point['density']
-                predicted = point['predicted_value']
-                current = point['ground_truth_value']
-                change = point['scenario_factor']
-                
-                if density > 500:
-                    area_type = "urban"
-                elif density > 100:
-                    area_type = "suburban"
-                else:
-                    area_type = "rural"
-                
-                change_percent = (1 - change) * 100
-                if change_percent > 10:
-                    trend = "significant reduction"
-                elif change_percent >= 0:
-                    trend = "moderate reduction"
-                else:
-                    trend = "marginal increase"
+            STAGE_STATS.record("county_insights", "error")
+            insights, missing = {}, insight_schema.county_names
+        
+        if missing:
+            # Fill only the counties the model did not return with the templated insight
+            print(f"Using fallback insights for {len(missing)} counties")
+            STAGE_STATS.record_fallback("county_insights")
+            points_by_name = {point['name']: point for point in data_points}
+            for name in missing:
+                insights[name] = self._fallback_insight(points_by_name[name], metric, unit)
+        
+        return insights
+    
+    @staticmethod
+    def _fallback_insight(point, metric, unit):
+        """Templated insight for a county, used when the LLM gives no usable text."""
+        density = point['density']
+        predicted = point['predicted_value']
+        current = point['ground_truth_value']
+        change = point['scenario_factor']
+        
+        if density > 500:
+            area_type = "urban"
+        elif density > 100:
+            area_type = "suburban"
+        else:
+            area_type = "rural"
+        
+        change_percent = (1 - change) * 100
+        if change_percent > 10:
+            trend = "significant reduction"
+        elif change_percent >= 0:
+            trend = "moderate reduction"
+        else:
+            trend = "marginal increase"
 
-                fallback_insights[county_name] = (
-                    f"As a {area_type} county (Density: {density} per sq mi), the predicted {metric} level of {predicted:.1f} {unit} "
-                    f"represents a {trend} of {abs(change_percent):.1f}% from the baseline of {current:.1f} {unit} (Factor: {change:.4f}x). "
-                    f"The impact suggests a measurable decrease in local emissions linked to reduced air-traffic support infrastructure."
-                )
-            
-            return fallback_insights
\ No newline at end of file
+        return (
+            f"As a {area_type} county (Density: {density} per sq mi), the predicted {metric} level of {predicted:.1f} {unit} "
+            f"represents a {trend} of {abs(change_percent):.1f}% from the baseline of {current:.1f} {unit} (Factor: {change:.4f}x). "
+            f"The impact suggests a measurable decrease in local emissions linked to reduced air-traffic support infrastructure."
+        )
\ No newline at end of file
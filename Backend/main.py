@@ -1,7 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from data_engineers import DirectorofDataEngineering, GeminiDataEngineer
+from relevance_classifier import RelevanceClassifier
+from structured_output import STAGE_STATS
 import os
 from dotenv import load_dotenv
 
@@ -26,10 +29,23 @@ app.add_middleware(
 
 # Configuration
 SIMULATION_FILEPATH = "unique_lat_lon.csv"
+RELEVANCE_LOG_FILEPATH = os.getenv("RELEVANCE_LOG_FILEPATH", "relevance_log.jsonl")
+
+# Local relevance fast path, trained on previously logged LLM verdicts
+relevance_classifier = RelevanceClassifier.from_log(
+    RELEVANCE_LOG_FILEPATH,
+    relevant_threshold=float(os.getenv("RELEVANCE_RELEVANT_THRESHOLD", RelevanceClassifier.RELEVANT_THRESHOLD)),
+    irrelevant_threshold=float(os.getenv("RELEVANCE_IRRELEVANT_THRESHOLD", RelevanceClassifier.IRRELEVANT_THRESHOLD)),
+    min_logged_verdicts=int(os.getenv("RELEVANCE_MIN_LOGGED_VERDICTS", RelevanceClassifier.MIN_LOGGED_VERDICTS))
+)
 
 # Initialize Director and Engineer instances
 try:
-    director = DirectorofDataEngineering(SIMULATION_FILEPATH)
+    director = DirectorofDataEngineering(
+        SIMULATION_FILEPATH,
+        relevance_classifier=relevance_classifier,
+        relevance_log_file=RELEVANCE_LOG_FILEPATH
+    )
     engineer = GeminiDataEngineer()
 except Exception as e:
     print(f"FATAL: Failed to initialize Gemini clients. Check API key: {e}")
@@ -38,6 +54,8 @@ except Exception as e:
 
 class ScenarioPrompt(BaseModel):
     prompt: str
+    ensemble_samples: int = Field(default=0, ge=0, le=100000)
+    seed: Optional[int] = Field(default=None, ge=0)
 
 class InsightsRequest(BaseModel):
     simulation_data: dict
@@ -50,6 +68,11 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "data-simulation-api"}
 
+@app.get("/api/stats")
+async def llm_stats():
+    """Structured-output outcomes, parse-failure and fallback rates per LLM stage."""
+    return {"stages": STAGE_STATS.snapshot()}
+
 @app.post("/api/simulate")
 async def simulate_scenario(scenario: ScenarioPrompt):
     """
@@ -73,7 +96,12 @@ async def simulate_scenario(scenario: ScenarioPrompt):
         director_prompt = director.directions(scenario.prompt)
         
         # Stage 2: Call Engineer to generate and post-process the data
-        simulated_data = engineer.simulate(director_prompt, director.pass_dummy_csv())
+        simulated_data = engineer.simulate(
+            director_prompt,
+            director.pass_dummy_csv(),
+            ensemble_samples=scenario.ensemble_samples,
+            seed=scenario.seed
+        )
         
         return {
             "success": True,
@@ -96,7 +124,7 @@ async def generate_insights(request: InsightsRequest):
     This endpoint takes the full simulation response and generates
     contextual insights for each county explaining the predicted values.
     """
-    if engineer is None:
+    if director is None or engineer is None:
         raise HTTPException(
             status_code=503,
             detail="Service not ready. Backend components failed to initialize."
@@ -107,7 +135,7 @@ async def generate_insights(request: InsightsRequest):
         
     try:
         # Generate insights for all counties
-        county_insights = engineer.generate_county_insights(request.simulation_data)
+        county_insights = engineer.generate_county_insights(request.simulation_data, director.pass_dummy_csv())
         
         return {
             "success": True,
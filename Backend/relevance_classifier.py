@@ -0,0 +1,290 @@
+import argparse
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+# Dots only between alphanumerics, so "pm2.5" stays one token but "cars." does not
+_WORD = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+
+# Topics the LLM classifier treats as relevant (see classify_prompt_relevance)
+ENVIRONMENTAL_KEYWORDS = {
+    "pollution", "pollutant", "emission", "emissions", "climate", "carbon", "co2",
+    "no2", "pm2.5", "aqi", "air", "smog", "ozone", "greenhouse", "methane",
+    "water", "soil", "wildfire", "wildfires", "smoke", "drought", "flood", "heat",
+    "weather", "storm", "eruption", "volcano", "traffic", "cars", "car", "vehicles",
+    "vehicle", "trucks", "planes", "flights", "airport", "ships", "shipping", "ports",
+    "transit", "highway", "industrial", "industry", "factory", "factories", "refinery",
+    "coal", "gas", "oil", "diesel", "gasoline", "fossil", "energy", "renewable",
+    "solar", "wind", "nuclear", "hydro", "power", "plants", "electric", "ev", "evs",
+    "urban", "infrastructure", "policy", "deforestation", "logging", "agriculture",
+}
+
+# Phrases matched on the raw prompt before tokenizing
+ENVIRONMENTAL_PHRASES = ("air quality", "water quality", "climate change", "power plant", "electric vehicle")
+
+# Marker features added by extract_features; they never count as evidence
+_MARKERS = {"__env_keyword__", "__no_env_keyword__"}
+
+# Function words that carry no topic signal on their own
+STOP_WORDS = {
+    "a", "about", "all", "an", "and", "are", "as", "at", "be", "by", "can", "could", "did",
+    "do", "does", "every", "everyone", "for", "from", "happen", "happens", "how", "i", "if",
+    "in", "is", "it", "me", "my", "of", "on", "or", "our", "should", "so", "that", "the",
+    "their", "there", "they", "this", "to", "us", "was", "we", "were", "what", "when",
+    "where", "which", "while", "who", "why", "will", "with", "would", "you", "your",
+}
+
+# Bootstraps the classifier before any prompts have been logged
+SEED_EXAMPLES: List[Tuple[str, bool]] = [
+    ("What happens if we remove all electric vehicles?", True),
+    ("Impact of closing all coal power plants", True),
+    ("Effect of doubling renewable energy production", True),
+    ("How would a major wildfire season affect air quality?", True),
+    ("What if traffic emissions in Seattle were cut in half?", True),
+    ("How will chewing bubblegum affect climate?", False),
+    ("What if everyone wore red shirts?", False),
+    ("Impact of eating ice cream on air quality", False),
+    ("Tell me a joke about cats", False),
+    ("Who will win the football game this weekend?", False),
+]
+
+
+def is_content_feature(feature):
+    """True for unigrams and bigrams made only of non-stop words."""
+    if feature in _MARKERS:
+        return False
+    return not any(word in STOP_WORDS for word in feature.split(" "))
+
+
+def extract_features(prompt):
+    """Lowercased unigrams, bigrams and environmental-keyword markers."""
+    text = prompt.lower()
+    words = _WORD.findall(text)
+    features = list(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+
+    keyword_hits = sum(1 for word in words if word in ENVIRONMENTAL_KEYWORDS)
+    keyword_hits += sum(1 for phrase in ENVIRONMENTAL_PHRASES if phrase in text)
+    if keyword_hits:
+        features.extend(["__env_keyword__"] * keyword_hits)
+    else:
+        features.append("__no_env_keyword__")
+    return features
+
+
+class RelevanceClassifier:
+    """
+    Multinomial Naive Bayes over lexical features, used as a fast path in
+    front of the LLM relevance check.
+
+    ``classify`` returns a verdict only once at least ``min_logged_verdicts``
+    LLM verdicts have been learned, the posterior clears one of the
+    thresholds and enough distinct known content features back it up;
+    otherwise it returns None and the caller should ask the LLM. The seed
+    examples alone never enable local answers, since their posteriors are
+    not calibrated.
+    """
+
+    RELEVANT_THRESHOLD = 0.97
+    IRRELEVANT_THRESHOLD = 0.03
+    MIN_EVIDENCE = 2
+    MIN_LOGGED_VERDICTS = 200
+
+    def __init__(self, relevant_threshold=RELEVANT_THRESHOLD, irrelevant_threshold=IRRELEVANT_THRESHOLD,
+                 min_evidence=MIN_EVIDENCE, min_logged_verdicts=MIN_LOGGED_VERDICTS, alpha=1.0):
+        self.relevant_threshold = relevant_threshold
+        self.irrelevant_threshold = irrelevant_threshold
+        self.min_evidence = min_evidence
+        self.min_logged_verdicts = min_logged_verdicts
+        self.alpha = alpha
+        self.logged_verdicts = 0
+        self.feature_counts = {True: Counter(), False: Counter()}
+        self.feature_totals = {True: 0, False: 0}
+        self.document_counts = {True: 0, False: 0}
+        self.vocabulary = set()
+
+    @classmethod
+    def from_log(cls, log_file, seed_examples=SEED_EXAMPLES, **kwargs):
+        """Build a classifier from the seed examples plus every logged LLM verdict."""
+        classifier = cls(**kwargs)
+        classifier.fit(seed_examples, logged=False)
+        classifier.fit(load_log(log_file))
+        return classifier
+
+    def update(self, prompt, relevant, logged=True):
+        """
+        Add one labelled prompt to the model.
+
+        Args:
+            prompt: User prompt
+            relevant: Verdict for the prompt
+            logged: Whether the verdict came from the LLM (counts towards
+                min_logged_verdicts) rather than the hand-written seeds
+        """
+        relevant = bool(relevant)
+        if logged:
+            self.logged_verdicts += 1
+        features = extract_features(prompt)
+        self.feature_counts[relevant].update(features)
+        self.feature_totals[relevant] += len(features)
+        self.document_counts[relevant] += 1
+        self.vocabulary.update(features)
+
+    def fit(self, examples: Iterable[Tuple[str, bool]], logged=True):
+        for prompt, relevant in examples:
+            self.update(prompt, relevant, logged=logged)
+        return self
+
+    def probability(self, prompt):
+        """
+        Return the posterior probability that the prompt is relevant.
+
+        Returns:
+            Tuple of (probability, number of distinct content features seen during training)
+        """
+        documents = self.document_counts[True] + self.document_counts[False]
+        log_odds = math.log((self.document_counts[True] + 1) / (documents + 2))
+        log_odds -= math.log((self.document_counts[False] + 1) / (documents + 2))
+
+        vocabulary_size = len(self.vocabulary) or 1
+        relevant_denominator = self.feature_totals[True] + self.alpha * vocabulary_size
+        irrelevant_denominator = self.feature_totals[False] + self.alpha * vocabulary_size
+
+        evidence = set()
+        for feature in extract_features(prompt):
+            if feature not in self.vocabulary:
+                continue
+            if is_content_feature(feature):
+                evidence.add(feature)
+            log_odds += math.log((self.feature_counts[True][feature] + self.alpha) / relevant_denominator)
+            log_odds -= math.log((self.feature_counts[False][feature] + self.alpha) / irrelevant_denominator)
+
+        # Clamp to keep exp() in range for long prompts
+        log_odds = max(min(log_odds, 50.0), -50.0)
+        return 1.0 / (1.0 + math.exp(-log_odds)), len(evidence)
+
+    def classify(self, prompt) -> Optional[bool]:
+        """
+        Return True/False for confidently relevant/irrelevant prompts, or None
+        when the LLM should decide.
+        """
+        if self.logged_verdicts < self.min_logged_verdicts:
+            return None
+        probability, evidence = self.probability(prompt)
+        if evidence < self.min_evidence:
+            return None
+        if probability >= self.relevant_threshold:
+            return True
+        if probability <= self.irrelevant_threshold:
+            return False
+        return None
+
+
+def append_log(log_file, prompt, relevant):
+    """Append one LLM verdict to the JSONL training log."""
+    with open(log_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"prompt": prompt, "relevant": bool(relevant)}) + "\n")
+
+
+def load_log(log_file):
+    """Read (prompt, relevant) pairs from the JSONL training log, skipping bad lines."""
+    if not log_file or not os.path.exists(log_file):
+        return []
+
+    examples = []
+    with open(log_file, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                examples.append((entry["prompt"], bool(entry["relevant"])))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+    return examples
+
+
+def evaluate(examples, folds=5, seed=0, **classifier_kwargs):
+    """
+    Cross-validate the local classifier against logged LLM verdicts.
+
+    Each fold trains on the seed examples plus the other folds and classifies
+    the held-out prompts. The min_logged_verdicts gate is disabled here so the
+    report measures the model itself; use it to decide whether the gate can
+    be lowered.
+
+    Returns:
+        Dict with coverage (share answered locally), agreement with the LLM on
+        those answers, agreement if every prompt were forced to a local verdict,
+        and the mean classification time in microseconds
+    """
+    examples = list(examples)
+    random.Random(seed).shuffle(examples)
+    folds = max(2, min(folds, len(examples)))
+
+    answered = agreed = forced_agreed = 0
+    confusion = Counter()
+    elapsed = 0.0
+    for fold in range(folds):
+        held_out = examples[fold::folds]
+        training = [example for i, example in enumerate(examples) if i % folds != fold]
+        classifier = RelevanceClassifier(min_logged_verdicts=0, **classifier_kwargs)
+        classifier.fit(SEED_EXAMPLES, logged=False).fit(training)
+
+        for prompt, relevant in held_out:
+            start = time.perf_counter()
+            verdict = classifier.classify(prompt)
+            elapsed += time.perf_counter() - start
+
+            probability, _ = classifier.probability(prompt)
+            forced_agreed += (probability >= 0.5) == relevant
+            if verdict is None:
+                confusion["deferred"] += 1
+                continue
+            answered += 1
+            agreed += verdict == relevant
+            confusion[f"llm_{relevant}_local_{verdict}".lower()] += 1
+
+    total = len(examples)
+    return {
+        "examples": total,
+        "folds": folds,
+        "coverage": answered / total if total else 0.0,
+        "agreement_when_answered": agreed / answered if answered else 0.0,
+        "forced_agreement": forced_agreed / total if total else 0.0,
+        "mean_classify_microseconds": elapsed / total * 1e6 if total else 0.0,
+        "confusion": dict(confusion),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Evaluate the local prompt relevance classifier against logged LLM verdicts."
+    )
+    parser.add_argument("--log", default="relevance_log.jsonl", help="JSONL log of prompts and LLM verdicts")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--relevant-threshold", type=float, default=RelevanceClassifier.RELEVANT_THRESHOLD)
+    parser.add_argument("--irrelevant-threshold", type=float, default=RelevanceClassifier.IRRELEVANT_THRESHOLD)
+    parser.add_argument("--min-evidence", type=int, default=RelevanceClassifier.MIN_EVIDENCE)
+    parser.add_argument("--min-logged-verdicts", type=int, default=RelevanceClassifier.MIN_LOGGED_VERDICTS)
+    args = parser.parse_args()
+
+    logged = load_log(args.log)
+    if not logged:
+        parser.exit(1, f"No logged verdicts found in {args.log}\n")
+
+    report = evaluate(
+        logged,
+        folds=args.folds,
+        seed=args.seed,
+        relevant_threshold=args.relevant_threshold,
+        irrelevant_threshold=args.irrelevant_threshold,
+        min_evidence=args.min_evidence,
+    )
+    # The server only answers locally once the log is this large
+    report["local_answers_enabled"] = len(logged) >= args.min_logged_verdicts
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,292 @@
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, create_model
+from typing_extensions import Annotated
+
+# Outcomes recorded once per structured LLM call; fallbacks are counted separately
+OUTCOMES = ("ok", "repaired", "partial", "parse_failure", "error")
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class StageStats:
+    """Thread-safe counters of structured-output outcomes per LLM stage."""
+
+    def __init__(self):
+        self._counts = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def record(self, stage, outcome):
+        """Record one call outcome (see OUTCOMES) for the given stage."""
+        with self._lock:
+            self._counts[stage]["calls"] += 1
+            self._counts[stage][outcome] += 1
+
+    def record_fallback(self, stage):
+        """Record that a stage answered (fully or partly) from its heuristic fallback."""
+        with self._lock:
+            self._counts[stage]["fallback"] += 1
+
+    def record_tokens(self, stage, usage_metadata):
+        """
+        Record input token usage for one request and log it.
+
+        ``prompt_token_count`` is the full input (what every request cost
+        before context caching); subtracting ``cached_content_token_count``
+        gives the tokens actually prefilled for this request.
+        """
+        if usage_metadata is None or usage_metadata.prompt_token_count is None:
+            return
+        input_tokens = usage_metadata.prompt_token_count
+        cached_tokens = usage_metadata.cached_content_token_count or 0
+        print(f"{stage}: {input_tokens} input tokens, {cached_tokens} from cache, "
+              f"{input_tokens - cached_tokens} prefilled")
+        with self._lock:
+            self._counts[stage]["token_reports"] += 1
+            self._counts[stage]["input_tokens"] += input_tokens
+            self._counts[stage]["cached_tokens"] += cached_tokens
+
+    def snapshot(self):
+        """
+        Return per-stage counts and rates.
+
+        Returns:
+            Dict mapping stage name to its call count, outcome counts,
+            parse-failure / fallback rates and, where usage was reported,
+            average input tokens per request before and after caching
+        """
+        with self._lock:
+            counts = {stage: dict(counter) for stage, counter in self._counts.items()}
+
+        report = {}
+        for stage, counter in counts.items():
+            calls = counter.get("calls", 0)
+            report[stage] = {
+                "calls": calls,
+                **{outcome: counter.get(outcome, 0) for outcome in OUTCOMES},
+                "fallback": counter.get("fallback", 0),
+                "parse_failure_rate": counter.get("parse_failure", 0) / calls if calls else 0.0,
+                "fallback_rate": counter.get("fallback", 0) / calls if calls else 0.0,
+            }
+            reports = counter.get("token_reports", 0)
+            if reports:
+                input_tokens = counter.get("input_tokens", 0)
+                cached_tokens = counter.get("cached_tokens", 0)
+                report[stage]["input_tokens_per_request"] = {
+                    "before_caching": input_tokens / reports,
+                    "after_caching": (input_tokens - cached_tokens) / reports,
+                }
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+# Shared across the Director and the Engineer so /api/stats sees every stage
+STAGE_STATS = StageStats()
+
+
+def _repair_truncated_json(text):
+    """
+    Recover the complete top-level members of a JSON document that was cut off mid-stream.
+
+    A member only counts as complete once it is followed by a comma or its
+    value's closing bracket; an unterminated last member (e.g. ``"Adams": 22``,
+    which might have been 22.7 or 225) is dropped rather than guessed at.
+    """
+    stack = []
+    in_string = False
+    escape = False
+    cuts = []  # indices where a top-level member has just ended
+
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                # Complete document followed by trailing text
+                cuts.append(i + 1)
+                break
+            if len(stack) == 1:
+                cuts.append(i + 1)
+        elif char == "," and len(stack) == 1:
+            cuts.append(i)
+
+    if not stack and cuts:
+        candidates = [text[:cuts[-1]]]
+    else:
+        closer = _CLOSERS[text[0]]
+        candidates = [text[:index].rstrip().rstrip(",") + closer for index in reversed(cuts[-8:])]
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_json_lenient(text):
+    """
+    Parse an LLM JSON response, repairing fenced or truncated output.
+
+    Args:
+        text: Raw response text from the model
+
+    Returns:
+        Tuple of (parsed value or None, "ok" | "repaired" | "parse_failure")
+    """
+    if not text:
+        return None, "parse_failure"
+
+    try:
+        return json.loads(text), "ok"
+    except json.JSONDecodeError:
+        pass
+
+    cleaned = _CODE_FENCE.sub("", text.strip())
+    starts = [i for i in (cleaned.find("{"), cleaned.find("[")) if i != -1]
+    if not starts:
+        return None, "parse_failure"
+
+    repaired = _repair_truncated_json(cleaned[min(starts):])
+    if repaired is None:
+        return None, "parse_failure"
+    return repaired, "repaired"
+
+
+def parse_structured(stage, text, model: Type[BaseModel]) -> Optional[BaseModel]:
+    """
+    Parse and validate a response against a Pydantic model, recording the outcome.
+
+    Returns:
+        The validated model instance, or None if the response is unusable
+    """
+    data, outcome = parse_json_lenient(text)
+    if data is None:
+        STAGE_STATS.record(stage, "parse_failure")
+        return None
+
+    try:
+        validated = model.model_validate(data)
+    except ValidationError as e:
+        print(f"Schema validation failed for {stage}: {e}")
+        STAGE_STATS.record(stage, "parse_failure")
+        return None
+
+    STAGE_STATS.record(stage, outcome)
+    return validated
+
+
+def _field_name(county_name):
+    """Turn a county name into a valid Python identifier for create_model."""
+    return re.sub(r"\W", "_", county_name)
+
+
+class CountySchema:
+    """
+    Response schema with one required property per county in the county table.
+
+    The generated model is passed to Gemini as ``response_schema`` so the model
+    has to emit every county, while ``parse`` accepts whatever valid subset a
+    truncated or partially wrong response still contains.
+    """
+
+    def __init__(self, title, county_names: List[str], value_type, description, **constraints):
+        self.county_names = list(county_names)
+        fields = {
+            _field_name(name): (
+                value_type,
+                Field(alias=name, description=f"{description} for {name} County", **constraints),
+            )
+            for name in self.county_names
+        }
+        self.model = create_model(title, **fields)
+        self._value_adapter = TypeAdapter(Annotated[value_type, Field(**constraints)])
+
+    def parse(self, stage, text) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Parse a per-county response, keeping every county value that validates.
+
+        Returns:
+            Tuple of (dict of accepted county values, list of counties missing or invalid)
+        """
+        data, outcome = parse_json_lenient(text)
+        if not isinstance(data, dict):
+            STAGE_STATS.record(stage, "parse_failure")
+            return {}, list(self.county_names)
+
+        accepted = {}
+        for name in self.county_names:
+            if name not in data:
+                continue
+            try:
+                accepted[name] = self._value_adapter.validate_python(data[name])
+            except ValidationError:
+                continue
+
+        missing = [name for name in self.county_names if name not in accepted]
+        if not accepted:
+            STAGE_STATS.record(stage, "parse_failure")
+        elif missing:
+            STAGE_STATS.record(stage, "partial")
+        else:
+            STAGE_STATS.record(stage, outcome)
+        return accepted, missing
+
+
+# Integer keywords that the Gemini Schema type encodes as int64 strings
+_INT64_KEYWORDS = {"minLength", "maxLength", "minItems", "maxItems", "minProperties", "maxProperties"}
+
+
+def _to_gemini_schema(node):
+    if isinstance(node, list):
+        return [_to_gemini_schema(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+
+    converted = {}
+    for key, value in node.items():
+        if key == "title":
+            continue
+        elif key == "type":
+            converted[key] = value.upper()
+        elif key in _INT64_KEYWORDS:
+            converted[key] = str(value)
+        elif key == "properties":
+            converted[key] = {name: _to_gemini_schema(prop) for name, prop in value.items()}
+            converted["propertyOrdering"] = list(value)
+        else:
+            converted[key] = _to_gemini_schema(value)
+    return converted
+
+
+def gemini_schema(model: Type[BaseModel]):
+    """
+    Build a Gemini ``response_schema`` from a Pydantic model's JSON schema.
+
+    Length constraints are kept in the wire format Gemini expects, and
+    properties keep their declaration order so county keys come back in
+    table order.
+    """
+    return _to_gemini_schema(model.model_json_schema())
@@ -0,0 +1,151 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import context_cache
+from context_cache import GeminiContextCache
+
+MODEL = "gemini-2.5-flash-lite"
+CONFIG = {"response_mime_type": "application/json"}
+
+
+class FakeCaches:
+    """Stands in for client.caches, recording create/delete calls."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.created = []
+        self.deleted = []
+        self.gates = {}  # display_name -> Event that create waits on
+
+    def create(self, model, config):
+        gate = self.gates.get(config["display_name"])
+        if gate is not None:
+            gate.wait(timeout=5)
+        if self.fail:
+            raise RuntimeError("cached content is too small")
+        self.created.append({"model": model, **config})
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+
+@pytest.fixture
+def caches():
+    return FakeCaches()
+
+
+@pytest.fixture
+def cache(caches):
+    return GeminiContextCache(SimpleNamespace(caches=caches), ttl_seconds=3600)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(context_cache.time, "time", lambda: now.value)
+    return now
+
+
+def test_request_references_handle_and_sends_only_query(cache, caches):
+    contents, config = cache.request("county_predictions", MODEL, "instructions", "table", "scenario", CONFIG)
+
+    assert contents == "scenario"
+    assert config == {**CONFIG, "cached_content": "cachedContents/1"}
+    assert "system_instruction" not in config
+    assert caches.created == [{
+        "model": MODEL,
+        "display_name": "county_predictions",
+        "system_instruction": "instructions",
+        "contents": ["table"],
+        "ttl": "3600s",
+    }]
+
+
+def test_same_prefix_reuses_handle(cache, caches):
+    cache.request("county_predictions", MODEL, "instructions", "table", "scenario 1", CONFIG)
+    _, config = cache.request("county_predictions", MODEL, "instructions", "table", "scenario 2", CONFIG)
+
+    assert config["cached_content"] == "cachedContents/1"
+    assert len(caches.created) == 1
+    assert caches.deleted == []
+
+
+def test_changed_prefix_deletes_old_cache(cache, caches):
+    cache.request("county_predictions", MODEL, "instructions", "table", "scenario", CONFIG)
+    _, config = cache.request("county_predictions", MODEL, "instructions", "new table", "scenario", CONFIG)
+
+    assert config["cached_content"] == "cachedContents/2"
+    assert caches.deleted == ["cachedContents/1"]
+
+    cache.request("county_predictions", MODEL, "new instructions", "new table", "scenario", CONFIG)
+    assert caches.deleted == ["cachedContents/1", "cachedContents/2"]
+
+
+def test_cache_is_recreated_before_ttl_expires(cache, caches, clock):
+    cache.request("county_predictions", MODEL, "instructions", "table", "scenario", CONFIG)
+
+    clock.value += cache.ttl_seconds - cache.EXPIRY_MARGIN_SECONDS - 1
+    _, config = cache.request("county_predictions", MODEL, "instructions", "table", "scenario", CONFIG)
+    assert config["cached_content"] == "cachedContents/1"
+
+    clock.value += 1
+    _, config = cache.request("county_predictions", MODEL, "instructions", "table", "scenario", CONFIG)
+    assert config["cached_content"] == "cachedContents/2"
+    assert caches.deleted == ["cachedContents/1"]
+
+
+def test_failed_create_falls_back_inline_without_retrying(monkeypatch):
+    caches = FakeCaches(fail=True)
+    cache = GeminiContextCache(SimpleNamespace(caches=caches))
+    attempts = []
+    original_create = caches.create
+
+    def counting_create(model, config):
+        attempts.append(config["display_name"])
+        return original_create(model, config)
+
+    monkeypatch.setattr(caches, "create", counting_create)
+
+    for _ in range(3):
+        contents, config = cache.request("county_predictions", MODEL, "instructions", "table", "scenario", CONFIG)
+        assert contents == ["table", "scenario"]
+        assert config == {**CONFIG, "system_instruction": "instructions"}
+        assert "cached_content" not in config
+
+    assert attempts == ["county_predictions"]
+    assert cache.creations == 0
+
+    # A new prefix gets a fresh attempt
+    cache.request("county_predictions", MODEL, "instructions", "new table", "scenario", CONFIG)
+    assert len(attempts) == 2
+
+
+def test_slow_create_does_not_block_other_slots(cache, caches):
+    caches.gates["county_predictions"] = threading.Event()
+    slow = threading.Thread(
+        target=cache.request,
+        args=("county_predictions", MODEL, "instructions", "table", "scenario", CONFIG),
+    )
+    slow.start()
+
+    fast_result = []
+    fast = threading.Thread(
+        target=lambda: fast_result.append(
+            cache.request("county_insights", MODEL, "insight instructions", "table", "results", CONFIG)
+        )
+    )
+    fast.start()
+    fast.join(timeout=2)
+
+    try:
+        assert not fast.is_alive()
+        assert slow.is_alive()
+        assert fast_result[0][1]["cached_content"] == "cachedContents/1"
+    finally:
+        caches.gates["county_predictions"].set()
+        slow.join(timeout=5)
+
+    assert cache.creations == 2
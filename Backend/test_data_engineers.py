@@ -0,0 +1,148 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import data_engineers
+from context_cache import LocalContextCache
+from data_engineers import DirectorofDataEngineering, GeminiDataEngineer
+from structured_output import STAGE_STATS
+
+CSV_HEADER = (
+    "County Name,Latitude,Longitude,County Seat,Pop. Density,Annual Avg. AQI (0-500),"
+    "PM2.5 Avg. (µg/m³),NO2 Avg. (ppb),GWP (CO2e per capita, MT/yr)\n"
+)
+CSV_ROWS = [
+    "Adams,46.9947,-118.4357,Ritzville,11,48,9.0,2.5,16.0\n",
+    "King,47.4907,-121.8339,Seattle,1000,45,8.5,12.0,9.0\n",
+]
+DIRECTOR_SPEC = {"target_metric": "NO2", "unit": "ppb"}
+
+
+class FakeModels:
+    """Returns canned responses and records every generate_content call."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    def generate_content(self, model, contents, config):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        text = self.respond(contents)
+        if isinstance(text, Exception):
+            raise text
+        return SimpleNamespace(text=text, usage_metadata=None)
+
+
+def fake_client(respond):
+    return SimpleNamespace(models=FakeModels(respond))
+
+
+def write_csv(path, rows):
+    path.write_text(CSV_HEADER + "".join(rows), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    return write_csv(tmp_path / "counties.csv", CSV_ROWS)
+
+
+@pytest.fixture
+def cache():
+    return LocalContextCache()
+
+
+def predictions_engineer(cache):
+    client = fake_client(lambda contents: json.dumps({"Adams": 2.0, "King": 10.0}))
+    return GeminiDataEngineer(context_cache=cache, client=client)
+
+
+def predict(engineer, csv_file, scenario="Remove all cars"):
+    county_data = engineer._load_county_data(csv_file, "NO2")
+    return engineer._generate_county_predictions(DIRECTOR_SPEC, county_data, "NO2", scenario)
+
+
+def test_predictions_reuse_cached_prefix(cache, csv_file):
+    engineer = predictions_engineer(cache)
+
+    assert predict(engineer, csv_file) == {"Adams": 2.0, "King": 10.0}
+    handle = cache._entries["county_predictions"][1]
+    assert predict(engineer, csv_file, scenario="Double all flights") == {"Adams": 2.0, "King": 10.0}
+
+    assert cache.creations == 1
+    assert cache._entries["county_predictions"][1] == handle
+
+    first, second = engineer.client.models.calls
+    # Same prefix and instruction; only the scenario query differs
+    assert first["contents"][0] == second["contents"][0]
+    assert first["config"]["system_instruction"] == data_engineers.COUNTY_PREDICTION_INSTRUCTION
+    assert "Remove all cars" in first["contents"][1]
+    assert "Double all flights" in second["contents"][1]
+
+
+def test_predictions_recreate_cache_when_table_changes(cache, csv_file, tmp_path):
+    engineer = predictions_engineer(cache)
+    predict(engineer, csv_file)
+    old_handle = cache._entries["county_predictions"][1]
+
+    changed_rows = [CSV_ROWS[0], CSV_ROWS[1].replace("12.0", "13.5")]
+    predict(engineer, write_csv(tmp_path / "changed.csv", changed_rows))
+
+    assert cache.creations == 2
+    assert cache._entries["county_predictions"][1] != old_handle
+    assert old_handle not in cache.prefixes
+    assert "13.5" in engineer.client.models.calls[-1]["contents"][0]
+
+
+def test_predictions_recreate_cache_when_instruction_changes(cache, csv_file, monkeypatch):
+    engineer = predictions_engineer(cache)
+    predict(engineer, csv_file)
+
+    monkeypatch.setattr(data_engineers, "COUNTY_PREDICTION_INSTRUCTION", "Updated instructions")
+    predict(engineer, csv_file)
+
+    assert cache.creations == 2
+    assert engineer.client.models.calls[-1]["config"]["system_instruction"] == "Updated instructions"
+
+
+def test_insights_prefix_comes_from_csv_not_payload(cache, csv_file):
+    client = fake_client(lambda contents: json.dumps({"Adams": "Rural insight.", "King": "Urban insight."}))
+    engineer = GeminiDataEngineer(context_cache=cache, client=client)
+
+    points = [
+        {"name": "Adams", "lat": 46.9947, "lon": -118.4357, "seat": "Ritzville", "density": 11,
+         "ground_truth_value": 2.5, "scenario_factor": 0.8, "predicted_value": 2.0, "normalized": 0.0},
+        {"name": "King", "lat": 47.4907, "lon": -121.8339, "seat": "Seattle", "density": 1000,
+         "ground_truth_value": 12.0, "scenario_factor": 0.8333, "predicted_value": 10.0, "normalized": 1.0},
+    ]
+    simulation_data = {"metric": "NO2", "unit": "ppb", "scenario_description": "Remove all cars",
+                       "dataPoints": points, "baseline": {"average": 6.0}}
+
+    assert engineer.generate_county_insights(simulation_data, csv_file) == {
+        "Adams": "Rural insight.", "King": "Urban insight."
+    }
+
+    # A reordered payload with rounded coordinates and extra fields keeps the same cache
+    reordered = [dict(point, lat=round(point["lat"], 1), extra=True) for point in reversed(points)]
+    engineer.generate_county_insights(dict(simulation_data, dataPoints=reordered), csv_file)
+
+    assert cache.creations == 1
+    first, second = client.models.calls
+    assert first["contents"][0] == second["contents"][0]
+    assert first["contents"][0] == engineer._county_table(engineer._load_county_data(csv_file, "NO2"))
+
+
+def test_directions_api_error_is_recorded():
+    STAGE_STATS.reset()
+    responses = iter([
+        json.dumps({"relevant": True, "makes_sense_to_model": True, "reason": "ok", "suggestions": []}),
+        ConnectionError("connection reset"),
+    ])
+    director = DirectorofDataEngineering("unique_lat_lon.csv", client=fake_client(lambda contents: next(responses)))
+
+    assert json.loads(director.directions("Remove all cars"))["error"] == "INVALID_SPECIFICATION"
+
+    stats = STAGE_STATS.snapshot()["directions"]
+    assert (stats["calls"], stats["error"]) == (1, 1)
+    STAGE_STATS.reset()
@@ -0,0 +1,119 @@
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from context_cache import LocalContextCache
+from data_engineers import GeminiDataEngineer
+from ensemble import monte_carlo_ensemble
+
+CSV_FILE = str(Path(__file__).parent / "unique_lat_lon.csv")
+SPEC = json.dumps({
+    "target_metric": "AQI",
+    "unit": "NA",
+    "target_timeframe": "2026",
+    "standard_deviation": 4.0,
+    "scenario_description": "Remove all cars from Washington roads"
+})
+
+
+def brute_force(mu, sigma, n_samples, seed, threshold):
+    """Materialize every realization with the same draw the ensemble uses."""
+    z = np.random.default_rng(seed).standard_normal(n_samples)
+    realizations = np.maximum(mu[:, None] + sigma * z[None, :], 0.0)
+    percentiles = np.percentile(realizations, [5, 50, 95], axis=1)
+    return percentiles, (realizations > threshold).mean(axis=1)
+
+
+def test_matches_brute_force():
+    mu = np.random.default_rng(0).uniform(0, 150, 300)
+    result = monte_carlo_ensemble(mu, 7.5, n_samples=5000, seed=42, threshold=100)
+    percentiles, exceedance = brute_force(mu, 7.5, 5000, 42, 100)
+
+    np.testing.assert_allclose(result["p5"], percentiles[0], atol=1e-9)
+    np.testing.assert_allclose(result["p50"], percentiles[1], atol=1e-9)
+    np.testing.assert_allclose(result["p95"], percentiles[2], atol=1e-9)
+    np.testing.assert_allclose(result["exceedance_probability"], exceedance, atol=1e-12)
+
+
+def test_clips_at_zero():
+    mu = np.array([0.5, 1.0, 50.0])
+    result = monte_carlo_ensemble(mu, 10.0, n_samples=2000, seed=1, threshold=0.0)
+    percentiles, exceedance = brute_force(mu, 10.0, 2000, 1, 0.0)
+
+    assert result["p5"][0] == 0.0
+    assert (result["p5"] >= 0).all()
+    np.testing.assert_allclose(result["p5"], percentiles[0], atol=1e-9)
+    np.testing.assert_allclose(result["exceedance_probability"], exceedance, atol=1e-12)
+
+
+def test_zero_standard_deviation():
+    mu = np.array([40.0, 100.0, 120.0])
+    result = monte_carlo_ensemble(mu, 0.0, n_samples=1000, seed=3, threshold=100)
+
+    for key in ("p5", "p50", "p95"):
+        np.testing.assert_array_equal(result[key], mu)
+    np.testing.assert_array_equal(result["exceedance_probability"], [0.0, 0.0, 1.0])
+
+
+def test_constant_predictions_normalize_to_half():
+    result = monte_carlo_ensemble([20.0, 20.0], 2.0, n_samples=1000, seed=0)
+
+    np.testing.assert_array_equal(result["normalized_p5"], [0.5, 0.5])
+    np.testing.assert_array_equal(result["normalized_p95"], [0.5, 0.5])
+    assert "exceedance_probability" not in result
+
+
+def test_empty_input():
+    result = monte_carlo_ensemble([], 2.0, n_samples=1000, seed=0, threshold=100)
+
+    for values in result.values():
+        assert values.shape == (0,)
+
+
+def fake_engineer():
+    def respond(contents):
+        return json.dumps({"King": 30.0, "Adams": 45.0})
+
+    models = SimpleNamespace(calls=[])
+
+    def generate_content(model, contents, config):
+        models.calls.append(contents)
+        return SimpleNamespace(text=respond(contents), usage_metadata=None)
+
+    models.generate_content = generate_content
+    client = SimpleNamespace(models=models)
+    return GeminiDataEngineer(context_cache=LocalContextCache(), client=client)
+
+
+def test_simulate_ensemble_is_reproducible_without_extra_calls():
+    engineer = fake_engineer()
+
+    first = engineer.simulate(SPEC, CSV_FILE, ensemble_samples=2000, seed=11)
+    second = engineer.simulate(SPEC, CSV_FILE, ensemble_samples=2000, seed=11)
+
+    # One county-prediction call per simulation, none for the ensemble
+    assert len(engineer.client.models.calls) == 2
+    assert first["ensemble"] == second["ensemble"]
+    assert first["ensemble"]["samples"] == 2000
+    assert first["ensemble"]["threshold"] == 100
+    assert set(first["ensemble"]["counties"]) == {point["name"] for point in first["dataPoints"]}
+
+    king = first["ensemble"]["counties"]["King"]
+    assert king["p5"] < king["p50"] < king["p95"]
+
+
+def test_simulate_without_ensemble_samples_has_no_ensemble():
+    assert "ensemble" not in fake_engineer().simulate(SPEC, CSV_FILE)
+
+
+def test_negative_seed_is_rejected(monkeypatch):
+    monkeypatch.chdir(Path(__file__).parent)
+    import main
+
+    client = TestClient(main.app)
+    response = client.post("/api/simulate", json={"prompt": "Remove all cars", "seed": -1})
+
+    assert response.status_code == 422
@@ -0,0 +1,84 @@
+from relevance_classifier import (
+    RelevanceClassifier, SEED_EXAMPLES, append_log, evaluate, extract_features, load_log
+)
+
+RELEVANT_TEMPLATES = [
+    "What if {} emissions dropped by half?",
+    "Impact of more {} on air quality",
+    "How would {} affect pollution in Seattle?",
+]
+IRRELEVANT_TEMPLATES = ["What if everyone liked {}?", "Tell me about {}", "Who invented {}?"]
+SOURCES = ["cars", "trucks", "factories", "wildfires", "coal plants", "ships", "planes", "diesel generators"]
+TOPICS = ["pizza", "cats", "jazz", "chess", "poetry", "basketball", "socks", "origami"]
+
+
+def logged_examples():
+    return (
+        [(template.format(source), True) for template in RELEVANT_TEMPLATES for source in SOURCES]
+        + [(template.format(topic), False) for template in IRRELEVANT_TEMPLATES for topic in TOPICS]
+    )
+
+
+def test_seed_examples_alone_never_answer_locally(tmp_path):
+    classifier = RelevanceClassifier.from_log(str(tmp_path / "missing.jsonl"))
+
+    assert classifier.logged_verdicts == 0
+    assert classifier.classify("What if we chewed bubblegum on electric vehicles?") is None
+    assert classifier.classify("What if everyone wore red shirts while driving cars?") is None
+
+
+def test_local_answers_start_after_min_logged_verdicts(tmp_path):
+    log_file = str(tmp_path / "relevance_log.jsonl")
+    examples = logged_examples()
+    for prompt, relevant in examples:
+        append_log(log_file, prompt, relevant)
+
+    gated = RelevanceClassifier.from_log(log_file, min_logged_verdicts=len(examples) + 1)
+    assert gated.classify("How would trucks affect pollution in Seattle?") is None
+
+    classifier = RelevanceClassifier.from_log(log_file, min_logged_verdicts=len(examples))
+    assert classifier.logged_verdicts == len(examples)
+    assert classifier.classify("How would trucks affect pollution in Seattle?") is True
+    assert classifier.classify("Who invented chess?") is False
+
+
+def test_evidence_counts_distinct_content_features_only():
+    classifier = RelevanceClassifier(min_logged_verdicts=0).fit(SEED_EXAMPLES)
+
+    # Stop words, their bigrams and the keyword markers are not evidence
+    assert classifier.probability("what if")[1] == 0
+    assert classifier.classify("what if") is None
+    # Only "tell" is a known content feature
+    assert classifier.probability("Tell me a story")[1] == 1
+    assert classifier.classify("Tell me a story") is None
+    # Repeated keywords count once
+    assert classifier.probability("coal coal coal")[1] == 1
+
+
+def test_sentence_punctuation_does_not_change_features():
+    assert extract_features("Ban all cars.") == extract_features("Ban all cars")
+    assert extract_features("Ban diesel... now!") == extract_features("Ban diesel now")
+    assert "__env_keyword__" in extract_features("Ban all cars.")
+
+
+def test_decimal_metric_names_stay_one_token():
+    features = extract_features("Cut PM2.5 by half.")
+    assert "pm2.5" in features
+    assert "__env_keyword__" in features
+
+
+def test_load_log_skips_bad_lines(tmp_path):
+    log_file = tmp_path / "relevance_log.jsonl"
+    append_log(str(log_file), "Impact of closing all coal power plants", True)
+    with open(log_file, "a", encoding="utf-8") as f:
+        f.write("not json\n{\"prompt\": \"missing verdict\"}\n")
+
+    assert load_log(str(log_file)) == [("Impact of closing all coal power plants", True)]
+
+
+def test_evaluate_reports_agreement():
+    report = evaluate(logged_examples(), folds=4)
+
+    assert report["examples"] == len(logged_examples())
+    assert 0.0 < report["coverage"] <= 1.0
+    assert report["agreement_when_answered"] >= 0.9
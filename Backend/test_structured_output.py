@@ -0,0 +1,119 @@
+import pytest
+from pydantic import BaseModel
+
+from structured_output import STAGE_STATS, CountySchema, parse_json_lenient, parse_structured
+
+COUNTIES = ["King", "Adams", "Grays Harbor"]
+
+
+class Verdict(BaseModel):
+    relevant: bool
+    reason: str
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    STAGE_STATS.reset()
+    yield
+    STAGE_STATS.reset()
+
+
+@pytest.fixture
+def predictions():
+    return CountySchema("CountyPredictions", COUNTIES, float, "Predicted value", ge=0)
+
+
+def test_parse_valid_json():
+    assert parse_json_lenient('{"King": 18.5}') == ({"King": 18.5}, "ok")
+
+
+def test_parse_fenced_json():
+    assert parse_json_lenient('```json\n{"King": 18.5}\n```') == ({"King": 18.5}, "repaired")
+
+
+def test_parse_trailing_garbage():
+    assert parse_json_lenient('{"King": 18.5} Hope this helps!') == ({"King": 18.5}, "repaired")
+
+
+def test_parse_truncated_mid_key_keeps_complete_members():
+    assert parse_json_lenient('{"King": 18.5, "Ada') == ({"King": 18.5}, "repaired")
+
+
+def test_parse_truncated_mid_value_drops_unfinished_member():
+    # "Adams": 22 may have been 22.7 or 225, so it must not be kept
+    assert parse_json_lenient('{"King": 18.5, "Adams": 22') == ({"King": 18.5}, "repaired")
+
+
+def test_parse_truncated_mid_string_drops_unfinished_member():
+    data, _ = parse_json_lenient('{"King": "Full insight.", "Adams": "Cut off mid')
+    assert data == {"King": "Full insight."}
+
+
+def test_parse_truncated_nested_value_is_dropped():
+    data, _ = parse_json_lenient('{"a": [1, 2], "b": [3, 4')
+    assert data == {"a": [1, 2]}
+
+
+def test_parse_unrecoverable():
+    assert parse_json_lenient("Sorry, I can't help with that.") == (None, "parse_failure")
+    assert parse_json_lenient('{"Kin') == (None, "parse_failure")
+    assert parse_json_lenient("") == (None, "parse_failure")
+
+
+def test_county_schema_complete(predictions):
+    accepted, missing = predictions.parse("stage", '{"King": 18.5, "Adams": 2.2, "Grays Harbor": 6}')
+    assert accepted == {"King": 18.5, "Adams": 2.2, "Grays Harbor": 6.0}
+    assert missing == []
+    assert STAGE_STATS.snapshot()["stage"]["ok"] == 1
+
+
+def test_county_schema_truncated_is_partial(predictions):
+    accepted, missing = predictions.parse("stage", '{"King": 18.5, "Adams": 2.2, "Grays Harbor": 6')
+    assert accepted == {"King": 18.5, "Adams": 2.2}
+    assert missing == ["Grays Harbor"]
+
+    stats = STAGE_STATS.snapshot()["stage"]
+    assert stats["partial"] == 1
+    assert stats["repaired"] == 0
+
+
+def test_county_schema_invalid_values_are_missing(predictions):
+    accepted, missing = predictions.parse(
+        "stage", '{"King": -3, "Adams": "lots", "Grays Harbor": 6, "Unknown": 1}'
+    )
+    assert accepted == {"Grays Harbor": 6.0}
+    assert missing == ["King", "Adams"]
+    assert STAGE_STATS.snapshot()["stage"]["partial"] == 1
+
+
+def test_county_schema_nothing_usable(predictions):
+    accepted, missing = predictions.parse("stage", '["not", "an", "object"]')
+    assert accepted == {}
+    assert missing == COUNTIES
+    assert STAGE_STATS.snapshot()["stage"]["parse_failure"] == 1
+
+
+def test_parse_structured_outcomes():
+    assert parse_structured("classify", '{"relevant": true, "reason": "ok"}', Verdict).relevant
+    assert parse_structured("classify", '```\n{"relevant": false, "reason": "no"}\n```', Verdict) is not None
+    assert parse_structured("classify", '{"relevant": "maybe", "reason": "?"}', Verdict) is None
+    assert parse_structured("classify", "not json", Verdict) is None
+
+    stats = STAGE_STATS.snapshot()["classify"]
+    assert stats["calls"] == 4
+    assert (stats["ok"], stats["repaired"], stats["parse_failure"]) == (1, 1, 2)
+    assert stats["parse_failure_rate"] == 0.5
+
+
+def test_stats_fallback_and_tokens():
+    class Usage:
+        prompt_token_count = 2000
+        cached_content_token_count = 1800
+
+    STAGE_STATS.record("county_predictions", "error")
+    STAGE_STATS.record_fallback("county_predictions")
+    STAGE_STATS.record_tokens("county_predictions", Usage())
+
+    stats = STAGE_STATS.snapshot()["county_predictions"]
+    assert stats["fallback_rate"] == 1.0
+    assert stats["input_tokens_per_request"] == {"before_caching": 2000.0, "after_caching": 200.0}